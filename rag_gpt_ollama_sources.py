@@ -1,20 +1,37 @@
 import streamlit as st
 import faiss
 import numpy as np
-import subprocess
 import os
+import itertools
+import json
+import shutil
+import socket
+import sqlite3
+import tempfile
 import time
+import threading
 import requests
+import torch
+from contextlib import contextmanager
 from sentence_transformers import SentenceTransformer
 
 # ======================================================
 # CONFIGURATION
 # ======================================================
 EMBED_MODEL = "all-MiniLM-L6-v2"
+ONNX_DIR = "onnx_minilm"  # ONNX export of EMBED_MODEL, created on first run
 VECTOR_DB = "rag_index.faiss"
-DOC_STORE = "rag_docs.npy"
+DOC_STORE = "rag_docs.db"
+LEGACY_DOC_STORE = "rag_docs.npy"  # doc list paired with the original IndexFlatL2 cache
 OLLAMA_MODEL = "phi3:mini"  # or 'llama3' if available
+OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+OLLAMA_KEEP_ALIVE = "15m"  # keep the model loaded between queries
 SERPER_API_KEY = ""
+EMBED_DIM = 384
+HNSW_M = 32
+BRUTE_FORCE_MAX = 10_000  # below this, search the embedding matrix directly
+MAX_CACHED_DOCS = 50_000  # past this, evict least recently used docs
+EVICT_FRACTION = 0.1  # share of MAX_CACHED_DOCS freed per eviction
 
 # ======================================================
 # STREAMLIT PAGE CONFIG
@@ -62,31 +79,320 @@ body { background-color: #0E1117; color: #FAFAFA; }
 # CACHE RESOURCES
 # ======================================================
 @st.cache_resource
+def configure_threads():
+    # Some service managers start the process with a single intra-op thread;
+    # use every core for SBERT encoding instead. Torch applies this setting
+    # process-wide, so once is enough.
+    cpus = os.cpu_count() or 1
+    try:
+        torch.set_num_threads(max(1, cpus - 1))
+        torch.set_num_interop_threads(2)
+    except RuntimeError:
+        pass  # inter-op pool already started
+
+def configure_faiss_threads():
+    # OpenMP's thread count is per calling thread, and Streamlit runs each
+    # rerun on a new one, so this is applied on every rerun (and in worker
+    # threads that touch the index) rather than cached.
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+class OnnxEmbedder:
+    # Mirrors the part of SentenceTransformer.encode used here: mean pooling
+    # over the token embeddings, optionally L2-normalized.
+    def __init__(self, model, tokenizer, max_length=256):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        out = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            hidden = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"][..., None].astype(hidden.dtype)
+            out.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        vecs = np.concatenate(out) if out else np.empty((0, EMBED_DIM), dtype="float32")
+        if normalize_embeddings:
+            vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs
+
+def load_onnx_embedder():
+    import onnxruntime as ort
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = os.cpu_count() or 1
+    if os.path.isdir(ONNX_DIR):
+        model = ORTModelForFeatureExtraction.from_pretrained(ONNX_DIR, session_options=options)
+        tokenizer = AutoTokenizer.from_pretrained(ONNX_DIR)
+    else:
+        # Export into a scratch dir and rename it into place, so an interrupted
+        # export never leaves a half-written ONNX_DIR behind.
+        name = f"sentence-transformers/{EMBED_MODEL}"
+        tmp = tempfile.mkdtemp(prefix=f"{ONNX_DIR}-", dir=os.path.dirname(os.path.abspath(ONNX_DIR)))
+        try:
+            model = ORTModelForFeatureExtraction.from_pretrained(name, export=True, session_options=options)
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            model.save_pretrained(tmp)
+            tokenizer.save_pretrained(tmp)
+            os.replace(tmp, ONNX_DIR)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+    return OnnxEmbedder(model, tokenizer)
+
+def load_embedder():
+    # Returns (model, warning). MiniLM tolerates reduced precision well: FP16
+    # on GPU barely moves cosine scores. On CPU, ONNX Runtime avoids PyTorch's
+    # per-op overhead; if it can't be loaded (optimum missing, no network for
+    # the first export, a broken ONNX_DIR), fall back to int8 quantization.
+    if torch.cuda.is_available():
+        return SentenceTransformer(EMBED_MODEL).to("cuda").half(), None
+    try:
+        return load_onnx_embedder(), None
+    except Exception as e:
+        model = SentenceTransformer(EMBED_MODEL)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model, f"⚠️ ONNX embedder unavailable ({e}); using PyTorch instead."
+
+@st.cache_resource
+def start_embedder_warmup():
+    # Loads the model in the background while the page renders; callers
+    # block in get_embedder() only if it isn't ready yet.
+    holder, ready = {}, threading.Event()
+    def _warm():
+        try:
+            holder["model"], holder["warning"] = load_embedder()
+        except Exception as e:
+            holder["error"] = e
+        finally:
+            ready.set()
+    threading.Thread(target=_warm, daemon=True).start()
+    return holder, ready
+
 def get_embedder():
-    return SentenceTransformer(EMBED_MODEL)
+    holder, ready = start_embedder_warmup()
+    ready.wait()
+    if "error" in holder:
+        # Drop the failed warmup so the next call retries the load instead
+        # of re-raising this error until the process restarts.
+        start_embedder_warmup.clear()
+        raise holder["error"]
+    return holder["model"]
+
+def new_index():
+    # MiniLM is trained for cosine similarity: vectors are L2-normalized at
+    # encode time, so inner product gives the cosine score. The IDMap wrapper
+    # lets each vector carry its SQLite doc id.
+    index = faiss.IndexHNSWFlat(EMBED_DIM, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = 40
+    index.hnsw.efSearch = 16
+    return faiss.IndexIDMap(index)
+
+def index_contents(index):
+    # Returns (doc ids, vectors) stored in an IDMap-wrapped index.
+    ids = faiss.vector_to_array(index.id_map)
+    if index.ntotal == 0:
+        return ids, np.empty((0, EMBED_DIM), dtype="float32")
+    return ids, faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+
+def open_doc_db():
+    db = sqlite3.connect(DOC_STORE, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS docs("
+        "id INTEGER PRIMARY KEY, text TEXT, source TEXT, last_used REAL NOT NULL DEFAULT 0)"
+    )
+    return db
+
+@contextmanager
+def transaction(db):
+    # The connection is in autocommit mode, so writes group explicitly and
+    # a failure never leaves it stuck inside an open transaction.
+    db.execute("BEGIN")
+    try:
+        yield db
+        db.execute("COMMIT")
+    except BaseException:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+
+def migrate_legacy_cache(flat_index, db):
+    # The original cache was an IndexFlatL2 plus rag_docs.npy, where row i
+    # of the index is doc i. MiniLM's vectors were already unit length, so
+    # the L2 ranking carries over to inner product; they are copied into an
+    # IDMap index with id i + 1 and the docs into SQLite under the same ids.
+    # That cache re-added every snippet on repeated queries, so only the
+    # first row for each text is kept.
+    if not os.path.exists(LEGACY_DOC_STORE):
+        return None
+    docs = np.load(LEGACY_DOC_STORE, allow_pickle=True).tolist()
+    n = min(len(docs), flat_index.ntotal)
+    seen, rows = set(), []
+    for i, d in enumerate(docs[:n]):
+        if d["text"] not in seen:
+            seen.add(d["text"])
+            rows.append(i)
+    index = new_index()
+    if rows:
+        vecs = np.ascontiguousarray(flat_index.reconstruct_n(0, n)[rows], dtype="float32")
+        faiss.normalize_L2(vecs)
+        index.add_with_ids(vecs, np.array(rows, dtype="int64") + 1)
+    with transaction(db):
+        db.execute("DELETE FROM docs")
+        db.executemany(
+            "INSERT INTO docs(id, text, source) VALUES (?, ?, ?)",
+            [(i + 1, docs[i]["text"], docs[i]["source"]) for i in rows],
+        )
+    faiss.write_index(index, VECTOR_DB)
+    return index
+
+@st.cache_resource
+def get_store_lock():
+    # Every Streamlit session shares the index, matrix and SQLite connection.
+    return threading.Lock()
 
 @st.cache_resource
 def load_faiss():
-    if os.path.exists(VECTOR_DB) and os.path.exists(DOC_STORE):
+    db = open_doc_db()
+    index = None
+    if os.path.exists(VECTOR_DB):
         try:
             index = faiss.read_index(VECTOR_DB)
-            docs = np.load(DOC_STORE, allow_pickle=True).tolist()
+            if not isinstance(index, faiss.IndexIDMap):
+                index = migrate_legacy_cache(index, db)
         except:
-            index, docs = faiss.IndexFlatL2(384), []
+            index = None
+    if index is None:
+        index = new_index()
+    index_ids = set(index_contents(index)[0].tolist())
+    db_ids = {i for (i,) in db.execute("SELECT id FROM docs")}
+    if not index_ids <= db_ids:
+        index = new_index()
+        db.execute("DELETE FROM docs")
     else:
-        index, docs = faiss.IndexFlatL2(384), []
-    return index, docs
+        # Rows inserted after the last index flush have no vectors.
+        db.executemany("DELETE FROM docs WHERE id = ?", [(i,) for i in db_ids - index_ids])
+    doc_ids_by_hash = {hash(text): i for i, text in db.execute("SELECT id, text FROM docs")}
+    return index, db, doc_ids_by_hash
+
+class EmbeddingMatrix:
+    # Copy of the index vectors, their doc ids and last-hit times, grown by
+    # doubling, so small caches can be searched with one BLAS matmul instead
+    # of a FAISS call and stale docs can be evicted.
+    def __init__(self, ids, vecs, last_used, capacity=1024):
+        self.n_rows = 0
+        self.emb = np.empty((0, EMBED_DIM), dtype="float32")
+        self.ids = np.empty(0, dtype="int64")
+        self.last_used = np.empty(0)
+        self._grow(max(capacity, len(vecs)))
+        self.add(ids, vecs, now=last_used)
+
+    def _grow(self, size):
+        n = self.n_rows
+        emb = np.empty((size, EMBED_DIM), dtype="float32")
+        ids = np.empty(size, dtype="int64")
+        last_used = np.empty(size)
+        emb[:n], ids[:n], last_used[:n] = self.emb[:n], self.ids[:n], self.last_used[:n]
+        self.emb, self.ids, self.last_used = emb, ids, last_used
+
+    def add(self, ids, vecs, now=None):
+        end = self.n_rows + len(vecs)
+        if end > len(self.emb):
+            self._grow(max(end, 2 * len(self.emb)))
+        self.emb[self.n_rows:end] = vecs
+        self.ids[self.n_rows:end] = ids
+        self.last_used[self.n_rows:end] = time.time() if now is None else now
+        self.n_rows = end
+
+    def touch(self, ids, now):
+        n = self.n_rows
+        self.last_used[:n][np.isin(self.ids[:n], ids)] = now
+
+    def evict(self, count):
+        # Drops the `count` least recently used rows and returns their ids.
+        n = self.n_rows
+        victims = np.lexsort((self.ids[:n], self.last_used[:n]))[:count]
+        victim_ids = self.ids[victims].copy()
+        keep = np.ones(n, dtype=bool)
+        keep[victims] = False
+        kept = int(keep.sum())
+        self.emb[:kept] = self.emb[:n][keep]
+        self.ids[:kept] = self.ids[:n][keep]
+        self.last_used[:kept] = self.last_used[:n][keep]
+        self.n_rows = kept
+        return victim_ids
+
+    def search(self, vec, top_k):
+        sims = self.emb[:self.n_rows] @ vec[0]
+        if top_k < self.n_rows:
+            # Partial selection is O(N); only the top_k survivors get sorted.
+            top = np.argpartition(-sims, top_k - 1)[:top_k]
+        else:
+            top = np.arange(self.n_rows)
+        return self.ids[top[np.argsort(-sims[top])]]
+
+@st.cache_resource
+def load_embedding_matrix(_index, _db):
+    ids, vecs = index_contents(_index)
+    last_used = dict(_db.execute("SELECT id, last_used FROM docs"))
+    return EmbeddingMatrix(ids, vecs, np.array([last_used.get(int(i), 0.0) for i in ids]))
+
+@st.cache_resource
+def get_http_session():
+    # Shared across reruns so connections to Serper and Ollama stay open
+    # and the TLS handshake with Serper is only paid once.
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource
+def warm_ollama(_http):
+    # An empty prompt just loads the model, so the first query doesn't pay for it.
+    def _warm():
+        try:
+            _http.post(OLLAMA_URL, json={"model": OLLAMA_MODEL, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE}, timeout=120)
+        except requests.RequestException:
+            pass  # reported when a query is actually made
+    threading.Thread(target=_warm, daemon=True).start()
 
 @st.cache_data(ttl=60)
 def is_connected():
-    try:
-        requests.get("https://www.google.com", timeout=3)
-        return True
-    except:
-        return False
+    # Opens a TCP connection to Serper, so a cached or hosts-file DNS answer
+    # doesn't count as online. The lookup itself has no timeout, so the probe
+    # runs in a worker thread and the render waits at most ~1.5 s.
+    reachable = []
+    def _probe():
+        try:
+            socket.create_connection(("google.serper.dev", 443), timeout=1).close()
+            reachable.append(True)
+        except OSError:
+            pass
+    probe = threading.Thread(target=_probe, daemon=True)
+    probe.start()
+    probe.join(1.5)
+    return bool(reachable)
 
-embedder = get_embedder()
-index, doc_store = load_faiss()
+configure_threads()
+configure_faiss_threads()
+start_embedder_warmup()
+store_lock = get_store_lock()
+index, doc_db, doc_ids_by_hash = load_faiss()
+emb_matrix = load_embedding_matrix(index, doc_db)
+http = get_http_session()
+warm_ollama(http)
 
 # ======================================================
 # RAG CORE FUNCTIONS
@@ -95,7 +401,7 @@ def fetch_web_results(query, num_results=5):
     headers = {"X-API-KEY": SERPER_API_KEY, "Content-Type": "application/json"}
     data = {"q": query, "num": num_results, "hl": "en"}
     try:
-        res = requests.post("https://google.serper.dev/search", headers=headers, json=data, timeout=10)
+        res = http.post("https://google.serper.dev/search", headers=headers, json=data, timeout=10)
         results = res.json().get("organic", [])
         docs = []
         for r in results:
@@ -109,36 +415,146 @@ def fetch_web_results(query, num_results=5):
         st.warning(f"⚠️ Web fetch error: {e}")
         return []
 
-def add_to_index(text, source):
-    vec = embedder.encode([text]).astype("float32")
-    index.add(vec)
-    doc_store.append({"text": text, "source": source})
+def embed_texts(texts, batch_size=16):
+    # Encode shortest-first so each mini-batch pads to a similar length,
+    # then scatter the vectors back into the caller's order.
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vecs = get_embedder().encode(
+        [texts[i] for i in order],
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    )
+    return vecs[np.argsort(order)].astype("float32", copy=False)
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _embed(text):
+    # Bytes rather than an ndarray keep the cached entries compact.
+    return get_embedder().encode([text], convert_to_numpy=True, normalize_embeddings=True).astype("float32").tobytes()
+
+def embed_query(query):
+    # MiniLM's tokenizer is uncased, so case and spacing don't change the vector.
+    key = " ".join(query.split()).lower()
+    return np.frombuffer(_embed(key), dtype="float32").reshape(1, EMBED_DIM)
+
+def add_to_index(texts, sources):
+    # Callers hold store_lock. Snippets already cached are only marked as
+    # used, so repeated queries don't grow the store. New hashes are recorded
+    # once the snippets are actually stored, so a failed write doesn't hide
+    # them from later queries.
+    rows, new_hashes, cached_ids = [], [], set()
+    for text, source in zip(texts, sources):
+        h = hash(text)
+        if h in doc_ids_by_hash:
+            cached_ids.add(doc_ids_by_hash[h])
+        elif h not in new_hashes:
+            new_hashes.append(h)
+            rows.append((text, source))
+    if cached_ids:
+        touch_docs(sorted(cached_ids))
+    if not rows:
+        return False
+    vecs = embed_texts([text for text, _ in rows])
+    now = time.time()
+    with transaction(doc_db):
+        (next_id,) = doc_db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM docs").fetchone()
+        ids = np.arange(next_id, next_id + len(rows), dtype="int64")
+        doc_db.executemany(
+            "INSERT INTO docs(id, text, source, last_used) VALUES (?, ?, ?, ?)",
+            [(int(i), text, source, now) for i, (text, source) in zip(ids, rows)],
+        )
+    index.add_with_ids(vecs, ids)
+    emb_matrix.add(ids, vecs, now=now)
+    doc_ids_by_hash.update(zip(new_hashes, ids.tolist()))
+    return True
+
+def touch_docs(ids):
+    # Callers hold store_lock. Recency is persisted so LRU eviction survives
+    # restarts.
+    now = time.time()
+    emb_matrix.touch(ids, now)
+    with transaction(doc_db):
+        doc_db.executemany("UPDATE docs SET last_used = ? WHERE id = ?", [(now, int(i)) for i in ids])
+
+def fetch_docs(ids):
+    # Returns docs in the order of the given ids.
+    placeholders = ",".join("?" * len(ids))
+    rows = doc_db.execute(f"SELECT id, text, source FROM docs WHERE id IN ({placeholders})", ids)
+    found = {i: {"text": text, "source": source} for i, text, source in rows}
+    return [found[i] for i in ids if i in found]
+
+def _flush_index():
+    # Docs are committed to SQLite on insert; only the index needs writing.
     faiss.write_index(index, VECTOR_DB)
-    np.save(DOC_STORE, np.array(doc_store, dtype=object))
+
+def evict_stale_docs():
+    # Callers hold store_lock. Rebuilding HNSW over ~45k vectors takes
+    # seconds, so online_rag runs this through schedule_eviction().
+    n = emb_matrix.n_rows
+    if n <= MAX_CACHED_DOCS:
+        return
+    victims = emb_matrix.evict(n - int(MAX_CACHED_DOCS * (1 - EVICT_FRACTION)))
+    # HNSW can't remove vectors, so rebuild the index in place from the
+    # surviving rows. Writing it before deleting the docs means a crash in
+    # between only leaves orphan rows, which load_faiss drops.
+    index.reset()
+    index.add_with_ids(emb_matrix.emb[:emb_matrix.n_rows], emb_matrix.ids[:emb_matrix.n_rows])
+    _flush_index()
+    with transaction(doc_db):
+        doc_db.executemany("DELETE FROM docs WHERE id = ?", [(int(i),) for i in victims])
+    doc_ids_by_hash.clear()
+    doc_ids_by_hash.update((hash(text), i) for i, text in doc_db.execute("SELECT id, text FROM docs"))
+
+def schedule_eviction():
+    if emb_matrix.n_rows <= MAX_CACHED_DOCS:
+        return
+    def _evict():
+        configure_faiss_threads()
+        with store_lock:
+            evict_stale_docs()
+    threading.Thread(target=_evict, daemon=True).start()
 
 def generate_with_ollama(prompt):
+    # Yields answer chunks as the model produces them.
+    data = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": True, "keep_alive": OLLAMA_KEEP_ALIVE}
     try:
-        result = subprocess.run(
-            ["ollama", "run", OLLAMA_MODEL],
-            input=prompt,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding="utf-8",
-            errors="ignore"
-        )
-        return result.stdout.strip()
-    except FileNotFoundError:
-        return "❌ Ollama not found. Please install it from https://ollama.ai/"
+        with http.post(OLLAMA_URL, json=data, stream=True, timeout=120) as res:
+            if not res.ok:
+                # Ollama explains failures (e.g. a model that isn't pulled) in the body.
+                try:
+                    error = res.json().get("error", res.text)
+                except ValueError:
+                    error = res.text
+                yield f"❌ Ollama Error: {error}"
+                return
+            for line in res.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    yield f"❌ Ollama Error: {chunk['error']}"
+                    return
+                yield chunk.get("response", "")
+                if chunk.get("done"):
+                    return
+    except requests.ConnectionError:
+        yield "❌ Ollama not running. Install it from https://ollama.ai/ and start `ollama serve`."
     except Exception as e:
-        return f"❌ Ollama Error: {e}"
+        yield f"❌ Ollama Error: {e}"
 
 def offline_rag(query, top_k=3):
-    if not doc_store or index.ntotal == 0:
-        return "⚠️ No offline data. Try online mode once to build cache.", []
-    vec = embedder.encode([query]).astype("float32")
-    _, idx = index.search(vec, top_k)
-    docs = [doc_store[i] for i in idx[0] if i < len(doc_store)]
+    vec = embed_query(query)
+    with store_lock:
+        # index.ntotal drops to 0 while eviction rebuilds it; the matrix doesn't.
+        if emb_matrix.n_rows == 0:
+            return "⚠️ No offline data. Try online mode once to build cache.", []
+        if emb_matrix.n_rows <= BRUTE_FORCE_MAX:
+            ids = emb_matrix.search(vec, top_k)
+        else:
+            _, ids = index.search(vec, top_k)
+            ids = ids[0][ids[0] >= 0]  # -1 pads results when fewer than top_k exist
+        touch_docs(ids)
+        docs = fetch_docs([int(i) for i in ids])
     if not docs:
         return "⚠️ No relevant offline information found.", []
     context = "\n\n".join(d["text"] for d in docs)
@@ -161,8 +577,13 @@ def online_rag(query):
     docs = fetch_web_results(query)
     if not docs:
         return "⚠️ No relevant web info found.", []
-    for d in docs:
-        add_to_index(d["text"], d["source"])
+    try:
+        with store_lock:
+            if add_to_index([d["text"] for d in docs], [d["source"] for d in docs]):
+                _flush_index()
+        schedule_eviction()
+    except Exception as e:
+        st.warning(f"⚠️ Offline cache update error: {e}")
     context = "\n\n".join(d["text"] for d in docs)
     sources = [d["source"] for d in docs if d["source"]]
     prompt = f"""
@@ -179,16 +600,29 @@ Answer clearly:
     return generate_with_ollama(prompt), sources
 
 # ======================================================
-# ANIMATED TYPING EFFECT
+# STREAMED ANSWER
 # ======================================================
-def animated_typing(text, speed=0.015):
+def stream_answer(chunks, refresh=0.04):
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    chunks = iter(chunks)
     container = st.empty()
+    container.markdown("<div class='answer-box'>▌</div>", unsafe_allow_html=True)
+    # Loading the model and reading the prompt can take a while before the
+    # first token, so keep a visible indicator up until it arrives.
+    with st.spinner("🧠 Thinking..."):
+        first = next(chunks, "")
     output = ""
-    for c in text:
-        output += c
-        container.markdown(f"<div class='answer-box'>{output}▌</div>", unsafe_allow_html=True)
-        time.sleep(speed)
+    last_render = 0.0
+    for chunk in itertools.chain([first], chunks):
+        output += chunk
+        now = time.monotonic()
+        if now - last_render >= refresh:
+            container.markdown(f"<div class='answer-box'>{output}▌</div>", unsafe_allow_html=True)
+            last_render = now
+    output = output.strip()
     container.markdown(f"<div class='answer-box'>{output}</div>", unsafe_allow_html=True)
+    return output
 
 # ======================================================
 # SIDEBAR (HISTORY + MODE)
@@ -216,7 +650,12 @@ with st.sidebar:
     else:
         st.warning("⚠️ No Internet Connection — Offline Mode Only")
         mode = "💻 Offline (FAISS + Ollama)"
-    st.caption(f"📂 {index.ntotal} docs cached locally.")
+    # Read from the matrix, not index.ntotal, which reads 0 mid-rebuild;
+    # taking store_lock here would stall the page for the whole rebuild.
+    st.caption(f"📂 {emb_matrix.n_rows} docs cached locally.")
+    embedder_state, embedder_ready = start_embedder_warmup()
+    if embedder_ready.is_set() and embedder_state.get("warning"):
+        st.warning(embedder_state["warning"])
     st.markdown("---")
 
 # ======================================================
@@ -238,10 +677,10 @@ if submit and query.strip():
             answer, sources = online_rag(query)
         else:
             answer, sources = offline_rag(query)
-    st.session_state["history"][-1]["answer"] = answer
 
     st.markdown("### 🧠 Assistant:")
-    animated_typing(answer)
+    answer = stream_answer(answer)
+    st.session_state["history"][-1]["answer"] = answer
 
     if sources:
         st.markdown("### 📚 Sources:")